@@ -5,6 +5,10 @@ import os
 from dotenv import load_dotenv
 import random
 import json # New import for JSON parsing
+import hashlib
+import math
+import threading
+import time
 from create_db import create_and_populate_db
 
 # Load environment variables from .env file
@@ -54,6 +58,237 @@ def get_order_details(order_id):
     order_data = cursor.fetchone()
     return order_data
 
+# --- Order Lookup Guard (Bloom filter + negative cache + per-session throttle) ---
+ORDER_FILTER_EXPECTED_IDS = 10000 # Minimum Bloom filter size; grows with the orders table
+ORDER_FILTER_FALSE_POSITIVE_RATE = 0.01
+ORDER_FILTER_REFRESH_SECONDS = 5 # How often the background thread checks the orders table for changes
+ORDER_FILTER_RECHECK_SECONDS = 1 # On a filter reject, re-check the table first if the last check is older than this
+ORDER_FILTER_MAX_STALENESS_SECONDS = 30 # Older than this (e.g. rebuilds failing) and filter rejects are re-checked in SQLite
+NEGATIVE_CACHE_TTL_SECONDS = 30 # How long a confirmed "not found" is remembered
+NEGATIVE_CACHE_MAX_ENTRIES = 5000
+LOOKUP_THROTTLE_MAX_ATTEMPTS = 10 # Distinct Order IDs a session may try...
+LOOKUP_THROTTLE_WINDOW_SECONDS = 60 # ...within this many seconds
+ORDER_METRICS_LOG_EVERY = 100 # Print lookup metrics to the server log every N lookups
+
+class OrderIDFilter:
+    """Bloom filter over Order IDs. No false negatives for IDs present when it was built."""
+
+    def __init__(self, expected_items, false_positive_rate):
+        self.num_bits = max(8, int(-expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / expected_items * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, order_id):
+        # Double hashing (Kirsch-Mitzenmacher) from a single digest
+        digest = hashlib.blake2b(str(order_id).encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, order_id):
+        for pos in self._positions(order_id):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, order_id):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(order_id))
+
+class OrderLookupGuard:
+    """Shared (cross-session) state that lets invalid Order IDs be rejected without querying SQLite."""
+
+    def __init__(self):
+        self.lock = threading.Lock() # Guards filter, generation, negative cache and metrics
+        self.refresh_lock = threading.Lock() # Serialises rebuilds and use of self.conn
+        # Dedicated connection: PRAGMA data_version changes whenever *another* connection commits,
+        # so it must not be shared with the connections that write orders
+        self.conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+        self.data_version = None # data_version seen at the last successful rebuild
+        self.id_filter = OrderIDFilter(ORDER_FILTER_EXPECTED_IDS, ORDER_FILTER_FALSE_POSITIVE_RATE)
+        self.generation = 0 # Bumped on every successful rebuild
+        self.checked_at = None # monotonic time the filter was last confirmed up to date
+        self.negative_cache = {} # order_id -> expiry timestamp
+        self.metrics = {
+            "lookups": 0,
+            "filter_rejects": 0,
+            "negative_cache_hits": 0,
+            "db_queries": 0,
+            "db_misses": 0,
+            "throttled": 0,
+        }
+
+    def refresh(self, max_age=None):
+        """
+        Rebuilds the whole filter from the orders table if the table changed since the last rebuild.
+        A full rebuild (rather than a rowid watermark) also picks up reused rowids, deletes and
+        OrderID updates. The change check is a single PRAGMA, so unchanged tables cost nothing.
+        With max_age, does nothing if the filter was confirmed up to date within max_age seconds.
+        """
+        with self.refresh_lock:
+            now = time.monotonic()
+            if max_age is not None and self.checked_at is not None and now - self.checked_at < max_age:
+                return
+            try:
+                cursor = self.conn.cursor()
+                data_version = cursor.execute("PRAGMA data_version").fetchone()[0]
+                if data_version == self.data_version:
+                    with self.lock:
+                        self.checked_at = now
+                    return
+                ids = {str(row[0]) for row in cursor.execute("SELECT OrderID FROM orders").fetchall()}
+            except sqlite3.Error as e:
+                print(f"Order ID filter rebuild failed, keeping previous filter: {e}")
+                return
+
+            new_filter = OrderIDFilter(max(len(ids), ORDER_FILTER_EXPECTED_IDS), ORDER_FILTER_FALSE_POSITIVE_RATE)
+            for order_id in ids:
+                new_filter.add(order_id)
+
+            self.data_version = data_version
+            with self.lock:
+                self.id_filter = new_filter
+                self.generation += 1
+                self.checked_at = now
+                # Forget cached misses for orders that now exist; Bloom false positives stay until their TTL
+                self.negative_cache = {k: v for k, v in self.negative_cache.items() if k not in ids}
+
+    def run_refresh_loop(self):
+        """Background thread body: keeps the filter current off the request path."""
+        while True:
+            time.sleep(ORDER_FILTER_REFRESH_SECONDS)
+            self.refresh()
+
+    def is_trusted(self):
+        """True if the filter was confirmed up to date recently enough for its rejects to be final."""
+        with self.lock:
+            return self.checked_at is not None and time.monotonic() - self.checked_at <= ORDER_FILTER_MAX_STALENESS_SECONDS
+
+    def is_cached_miss(self, order_id):
+        now = time.monotonic()
+        with self.lock:
+            expiry = self.negative_cache.get(order_id)
+            if expiry is None:
+                return False
+            if expiry <= now:
+                del self.negative_cache[order_id]
+                return False
+            return True
+
+    def cache_miss(self, order_id, generation):
+        """
+        Remembers a DB miss. `generation` is the filter generation read before the DB query;
+        if a rebuild happened since, the miss may already be stale and is not cached.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if generation != self.generation:
+                return
+            if len(self.negative_cache) >= NEGATIVE_CACHE_MAX_ENTRIES:
+                # Drop expired entries first, then the oldest ones if still full
+                self.negative_cache = {k: v for k, v in self.negative_cache.items() if v > now}
+                while len(self.negative_cache) >= NEGATIVE_CACHE_MAX_ENTRIES:
+                    self.negative_cache.pop(next(iter(self.negative_cache)))
+            self.negative_cache[order_id] = now + NEGATIVE_CACHE_TTL_SECONDS
+
+    def record(self, metric):
+        with self.lock:
+            self.metrics[metric] += 1
+            return self.metrics[metric]
+
+    def get_metrics(self):
+        """Returns a snapshot of the lookup counters plus the overall miss rate."""
+        with self.lock:
+            snapshot = dict(self.metrics)
+        misses = snapshot["filter_rejects"] + snapshot["negative_cache_hits"] + snapshot["db_misses"]
+        snapshot["miss_rate"] = misses / snapshot["lookups"] if snapshot["lookups"] else 0.0
+        return snapshot
+
+@st.cache_resource
+def get_order_lookup_guard():
+    guard = OrderLookupGuard()
+    guard.refresh() # Full build on first use
+    threading.Thread(target=guard.run_refresh_loop, name="order-id-filter-refresh", daemon=True).start()
+    return guard
+
+# NOTE: the throttle lives in st.session_state, so it only slows down a single browser tab.
+# Reloading the page or scripting fresh sessions gets a new budget; Streamlit 1.36 does not
+# expose the client address to key on. Brute-force protection against scripted clients has
+# to come from a reverse proxy / rate limiter in front of the app.
+def prune_lookup_attempts():
+    """Drops attempts older than the throttle window and returns {order_id: first_tried_at}."""
+    now = time.monotonic()
+    attempts = {
+        order_id: tried_at
+        for order_id, tried_at in st.session_state.get("order_lookup_attempts", {}).items()
+        if now - tried_at < LOOKUP_THROTTLE_WINDOW_SECONDS
+    }
+    st.session_state.order_lookup_attempts = attempts
+    return attempts
+
+def is_lookup_throttled(order_id, attempts):
+    """An ID already tried in the window is always allowed; a new one only while under the limit."""
+    return order_id not in attempts and len(attempts) >= LOOKUP_THROTTLE_MAX_ATTEMPTS
+
+def lookup_order(order_id):
+    """
+    Guarded wrapper around get_order_details.
+    Returns (order_data, throttled). Unknown IDs are rejected by the Bloom filter or the
+    negative cache before reaching SQLite; only possible hits are queried.
+    Metrics are counted once per submission: Streamlit reruns the script on every widget
+    interaction, and those repeat lookups of the same ID are not counted again.
+    """
+    order_id = order_id.strip()
+    if not order_id:
+        return None, False
+    guard = get_order_lookup_guard()
+
+    attempts = prune_lookup_attempts()
+    throttled = is_lookup_throttled(order_id, attempts)
+    # A new submission is a different ID, or the same ID moving in or out of the throttled state
+    is_new_submission = st.session_state.get("last_order_lookup") != (order_id, throttled)
+    st.session_state.last_order_lookup = (order_id, throttled)
+
+    if throttled:
+        if is_new_submission:
+            guard.record("throttled")
+        return None, True
+
+    attempts.setdefault(order_id, time.monotonic())
+    if is_new_submission:
+        if guard.record("lookups") % ORDER_METRICS_LOG_EVERY == 0:
+            print(f"Order lookup metrics: {guard.get_metrics()}")
+
+    # Read before any DB query so cache_miss can tell whether a rebuild raced with it
+    with guard.lock:
+        generation = guard.generation
+        id_filter = guard.id_filter
+
+    if not id_filter.might_contain(order_id):
+        # The customer usually types an order that was just created: make sure the filter
+        # has seen it before rejecting (a no-op PRAGMA if the table has not changed)
+        guard.refresh(max_age=ORDER_FILTER_RECHECK_SECONDS)
+        with guard.lock:
+            generation = guard.generation
+            id_filter = guard.id_filter
+
+    if not id_filter.might_contain(order_id) and guard.is_trusted():
+        if is_new_submission:
+            guard.record("filter_rejects")
+        return None, False
+
+    if guard.is_cached_miss(order_id):
+        if is_new_submission:
+            guard.record("negative_cache_hits")
+        return None, False
+
+    if is_new_submission:
+        guard.record("db_queries")
+    order_data = get_order_details(order_id)
+    if order_data is None:
+        # Bloom false positive, deleted order, or untrusted filter: remember it briefly
+        guard.cache_miss(order_id, generation)
+        if is_new_submission:
+            guard.record("db_misses")
+    return order_data, False
+
 # (Removed get_quiz_questions from DB, as we're primarily using AI now.
 # You can re-add if you want a choice between DB and AI quizzes)
 
@@ -299,10 +534,14 @@ if not st.session_state.quiz_active and not st.session_state.quiz_completed and
         help="Type the order ID found on your receipt or given by the cashier."
     )
 
+    order_id_input = order_id_input.strip() # Ignore stray spaces around the ID
+
     if order_id_input:
-        order_details = get_order_details(order_id_input)
+        order_details, lookup_throttled = lookup_order(order_id_input)
 
-        if order_details:
+        if lookup_throttled:
+            st.error("Too many Order ID attempts. Please wait a minute and try again.")
+        elif order_details:
             st.subheader(f"Details for Order ID: `{order_id_input}`")
             items = order_details['Items']
             status = order_details['Status']